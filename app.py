@@ -1,17 +1,38 @@
-from ariadne import MutationType, ObjectType, QueryType, load_schema_from_path, make_executable_schema
+import asyncio
+import contextlib
+import json
+import os
+from typing import Optional
+from ariadne import EnumType, MutationType, ObjectType, QueryType, load_schema_from_path, make_executable_schema
 from ariadne.asgi import GraphQL
+from ariadne.asgi.handlers import GraphQLHTTPHandler
 from graphql_sync_dataloaders import DeferredExecutionContext, SyncDataLoader
 from sqlalchemy import Engine, create_engine
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Mount, Route
 import uvicorn
+from profiling import Profiler
 from resolvers import Resolver
 
-from store import DataLoader
-from store.model import Base
+from store import ChangeFeed, DataLoader
+from store.model import Base, EntityType
 
 
 engine: Engine = create_engine("sqlite://", echo=True)
-Base.metadata.create_all(engine)
 loader = DataLoader(engine)
+change_feed = ChangeFeed(engine)
+
+CHANGE_STREAM_PAGE_SIZE = 500
+CHANGE_STREAM_POLL_SECONDS = 1.0
+
+# Profiling is off unless PROFILING_ENABLED=true; when off, the GraphQL app runs without any extra hooks
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+profiler = Profiler(
+    slow_threshold=float(os.environ.get("PROFILING_SLOW_THRESHOLD_SECONDS", 0.5)),
+    slow_sample_rate=float(os.environ.get("PROFILING_SLOW_SAMPLE_RATE", 0.1)),
+) if PROFILING_ENABLED else None
 
 def generate_schema(resolver: Resolver):
 
@@ -30,20 +51,89 @@ def generate_schema(resolver: Resolver):
     person = ObjectType("Person")
     resolver.resolve_person(person)
 
+    connection_node = ObjectType("ConnectionNode")
+    resolver.resolve_connection_node(connection_node)
+
+    entity_type = EnumType("EntityType", EntityType)
+
     type_defs = load_schema_from_path("schema.graphql")
 
     return make_executable_schema(
         type_defs, query, mutation, company, person_employment, person,
+        connection_node, entity_type,
         convert_names_case=True,
     )
 
 schema = generate_schema(Resolver(engine))
 
-app = GraphQL(schema, debug=True, context_value={
-    "company_data_loader": SyncDataLoader(loader.get_company),
-    "employment_data_loader": SyncDataLoader(loader.get_employment),
-    "person_data_loader": SyncDataLoader(loader.get_person),
-}, execution_context_class=DeferredExecutionContext)
+
+async def stream_changes(request: Request):
+    # Newline delimited JSON of every change after `cursor`, keeps polling for new changes when `follow` is set
+    try:
+        cursor = int(request.query_params.get("cursor", 0))
+    except ValueError:
+        return PlainTextResponse("cursor must be an integer", status_code=400)
+    follow = request.query_params.get("follow", "false").lower() == "true"
+
+    async def changes():
+        nonlocal cursor
+        while True:
+            # Stays on the event loop thread like the GraphQL resolvers: the in-memory engine gives every thread
+            # its own empty database, so a threadpool query would not see the store. Each poll is a bounded
+            # primary key range scan.
+            page = change_feed.changes_since(cursor, CHANGE_STREAM_PAGE_SIZE)
+            for change in page:
+                yield json.dumps(change) + "\n"
+            if len(page) > 0:
+                cursor = page[-1]["id"]
+            elif follow:
+                await asyncio.sleep(CHANGE_STREAM_POLL_SECONDS)
+            else:
+                return
+
+    return StreamingResponse(changes(), media_type="application/x-ndjson")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    # The in-memory engine keeps one database per thread, so create the tables on the thread serving requests
+    Base.metadata.create_all(engine)
+    yield
+
+
+def create_app(profiler: Optional[Profiler] = None) -> Starlette:
+    if profiler is None:
+        graphql_app = GraphQL(schema, debug=True, context_value={
+            "company_data_loader": SyncDataLoader(loader.get_company),
+            "employment_data_loader": SyncDataLoader(loader.get_employment),
+            "person_data_loader": SyncDataLoader(loader.get_person),
+        }, execution_context_class=DeferredExecutionContext)
+        return Starlette(routes=[
+            Route("/changes", stream_changes),
+            Mount("/", graphql_app),
+        ], lifespan=lifespan)
+
+    graphql_app = GraphQL(schema, debug=True, context_value={
+        "company_data_loader": profiler.data_loader("company", loader.get_company),
+        "employment_data_loader": profiler.data_loader("employment", loader.get_employment),
+        "person_data_loader": profiler.data_loader("person", loader.get_person),
+    }, execution_context_class=DeferredExecutionContext,
+        http_handler=GraphQLHTTPHandler(extensions=[profiler.extension]))
+
+    async def metrics(request: Request):
+        return PlainTextResponse(profiler.render_metrics(), media_type="text/plain; version=0.0.4")
+
+    async def slow_traces(request: Request):
+        return JSONResponse(list(profiler.slow_traces))
+
+    return Starlette(routes=[
+        Route("/changes", stream_changes),
+        Route("/metrics", metrics),
+        Route("/slow_traces", slow_traces),
+        Mount("/", graphql_app),
+    ], lifespan=lifespan)
+
+app = create_app(profiler)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
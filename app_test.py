@@ -0,0 +1,47 @@
+import json
+import unittest
+from starlette.testclient import TestClient
+
+from app import app
+from resolvers_test import CHANGES_SINCE_QUERY, INSERT_COMPANY_QUERY
+
+
+class TestApp(unittest.TestCase):
+    def test_change_stream_feature(self):
+        # The client runs the app on a single thread for the whole block, so every request sees the same in-memory store
+        with TestClient(app) as client:
+            def _graphql(query_string, variable_values):
+                r = client.post("/", json={"query": query_string, "variables": variable_values})
+                self.assertEqual(r.status_code, 200)
+                self.assertNotIn("errors", r.json())
+                return r.json()["data"]
+
+            # Step 1: Add 3 companies
+            _graphql(INSERT_COMPANY_QUERY, {
+                "companies": [
+                    {"company_id": 1, "company_name": "Big Corp 1", "headcount": 10000},
+                    {"company_id": 2, "company_name": "Small Corp 2", "headcount": 2000},
+                    {"company_id": 3, "company_name": "Startup 3", "headcount": 30},
+                ]
+            })
+            changes = _graphql(CHANGES_SINCE_QUERY, {"cursor": 0, "limit": 100})["changesSince"]["changes"]
+            self.assertEqual(len(changes), 3)
+
+            # Step 2: The stream returns the same changes as changesSince, and ends once the log is exhausted
+            r2 = client.get("/changes", params={"cursor": 0})
+            self.assertEqual(r2.status_code, 200)
+            self.assertEqual(r2.headers["content-type"], "application/x-ndjson")
+            self.assertListEqual([json.loads(line) for line in r2.text.splitlines()], changes)
+
+            # Step 3: Streaming from a cursor only returns the changes after it
+            r3 = client.get("/changes", params={"cursor": changes[0]["id"]})
+            self.assertEqual(r3.status_code, 200)
+            self.assertListEqual([json.loads(line) for line in r3.text.splitlines()], changes[1:])
+
+            # Step 4: A non-numeric cursor is rejected
+            r4 = client.get("/changes", params={"cursor": "abc"})
+            self.assertEqual(r4.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import random
+from collections import deque
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Deque, Dict, List, Optional
+
+from ariadne.contrib.tracing.utils import format_path, should_trace
+from ariadne.types import ContextValue, Extension, Resolver
+from graphql import GraphQLResolveInfo
+from graphql_sync_dataloaders import SyncDataLoader
+
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# The sampled request's extension, so DataLoader batches running outside of any resolver can add to its trace
+_traced_extension: ContextVar[Optional["ProfilingExtension"]] = ContextVar("traced_extension", default=None)
+
+
+class Histogram():
+    def __init__(self, buckets) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def render(self, name: str, labels: str) -> List[str]:
+        # Prometheus buckets are cumulative
+        lines = []
+        cumulative = 0
+        bucket_labels = labels + "," if labels else ""
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{bucket_labels}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{bucket_labels}le="+Inf"}} {self.count}')
+        labels = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{labels} {self.sum}")
+        lines.append(f"{name}_count{labels} {self.count}")
+        return lines
+
+
+class Profiler():
+    """Collects per-field and per-DataLoader statistics, rendered in Prometheus text format.
+
+    Requests slower than `slow_threshold` seconds keep their full trace, but only the
+    `slow_sample_rate` fraction of requests pays for recording one.
+
+    A field resolved through a DataLoader only queues its key, the batch function runs later on.
+    Its field histogram therefore measures just the queueing, while the time spent loading shows
+    up in the DataLoader batch histograms and as `loaders` entries of the trace.
+    """
+
+    def __init__(self, slow_threshold: float = 0.5, slow_sample_rate: float = 0.1, max_slow_traces: int = 100) -> None:
+        self.slow_threshold = slow_threshold
+        self.slow_sample_rate = slow_sample_rate
+        self.request_latency = Histogram(LATENCY_BUCKETS)
+        self.field_calls: Dict[str, int] = {}
+        self.field_latency: Dict[str, Histogram] = {}
+        self.loader_loads: Dict[str, int] = {}
+        self.loader_hits: Dict[str, int] = {}
+        self.loader_batch_sizes: Dict[str, Histogram] = {}
+        self.loader_batch_latency: Dict[str, Histogram] = {}
+        self.slow_traces: Deque[dict] = deque(maxlen=max_slow_traces)
+
+    def extension(self) -> "ProfilingExtension":
+        # Ariadne creates one extension per request from this factory
+        return ProfilingExtension(self)
+
+    def data_loader(self, name: str, batch_load_fn) -> "ProfiledDataLoader":
+        self.loader_loads.setdefault(name, 0)
+        self.loader_hits.setdefault(name, 0)
+        self.loader_batch_sizes.setdefault(name, Histogram(BATCH_SIZE_BUCKETS))
+        self.loader_batch_latency.setdefault(name, Histogram(LATENCY_BUCKETS))
+        return ProfiledDataLoader(self, name, batch_load_fn)
+
+    def record_field(self, field: str, duration: float) -> None:
+        self.field_calls[field] = self.field_calls.get(field, 0) + 1
+        if field not in self.field_latency:
+            self.field_latency[field] = Histogram(LATENCY_BUCKETS)
+        self.field_latency[field].observe(duration)
+
+    def record_request(self, duration: float, trace: Optional[dict]) -> None:
+        self.request_latency.observe(duration)
+        if trace is not None and duration >= self.slow_threshold:
+            trace["duration"] = duration
+            self.slow_traces.append(trace)
+
+    def render_metrics(self) -> str:
+        lines = [
+            "# HELP company_kg_request_duration_seconds GraphQL request wall time.",
+            "# TYPE company_kg_request_duration_seconds histogram",
+        ]
+        lines.extend(self.request_latency.render("company_kg_request_duration_seconds", ""))
+        lines.extend([
+            "# HELP company_kg_field_calls_total Resolver calls per field.",
+            "# TYPE company_kg_field_calls_total counter",
+        ])
+        lines.extend(f'company_kg_field_calls_total{{field="{field}"}} {count}'
+                     for field, count in sorted(self.field_calls.items()))
+        lines.extend([
+            "# HELP company_kg_field_duration_seconds Resolver wall time per field.",
+            "# TYPE company_kg_field_duration_seconds histogram",
+        ])
+        for field, histogram in sorted(self.field_latency.items()):
+            lines.extend(histogram.render("company_kg_field_duration_seconds", f'field="{field}"'))
+        lines.extend([
+            "# HELP company_kg_dataloader_loads_total Keys requested from each DataLoader.",
+            "# TYPE company_kg_dataloader_loads_total counter",
+        ])
+        lines.extend(f'company_kg_dataloader_loads_total{{loader="{loader}"}} {count}'
+                     for loader, count in sorted(self.loader_loads.items()))
+        lines.extend([
+            "# HELP company_kg_dataloader_cache_hits_total Keys served from the DataLoader cache.",
+            "# TYPE company_kg_dataloader_cache_hits_total counter",
+        ])
+        lines.extend(f'company_kg_dataloader_cache_hits_total{{loader="{loader}"}} {count}'
+                     for loader, count in sorted(self.loader_hits.items()))
+        lines.extend([
+            "# HELP company_kg_dataloader_batch_size Keys per DataLoader batch function call.",
+            "# TYPE company_kg_dataloader_batch_size histogram",
+        ])
+        for loader, histogram in sorted(self.loader_batch_sizes.items()):
+            lines.extend(histogram.render("company_kg_dataloader_batch_size", f'loader="{loader}"'))
+        lines.extend([
+            "# HELP company_kg_dataloader_batch_duration_seconds DataLoader batch function wall time.",
+            "# TYPE company_kg_dataloader_batch_duration_seconds histogram",
+        ])
+        for loader, histogram in sorted(self.loader_batch_latency.items()):
+            lines.extend(histogram.render("company_kg_dataloader_batch_duration_seconds", f'loader="{loader}"'))
+        return "\n".join(lines) + "\n"
+
+
+class ProfilingExtension(Extension):
+    def __init__(self, profiler: Profiler) -> None:
+        self.profiler = profiler
+        self.start = 0.0
+        # Only sampled requests record a trace, the rest just feed the histograms
+        self.trace: Optional[dict] = None
+        self._traced_token = None
+
+    def request_started(self, context: ContextValue) -> None:
+        self.start = perf_counter()
+        if random.random() < self.profiler.slow_sample_rate:
+            self.trace = {"operation": None, "resolvers": [], "loaders": []}
+            self._traced_token = _traced_extension.set(self)
+
+    def request_finished(self, context: ContextValue) -> None:
+        if self._traced_token is not None:
+            _traced_extension.reset(self._traced_token)
+            self._traced_token = None
+        self.profiler.record_request(perf_counter() - self.start, self.trace)
+
+    def resolve(self, next_: Resolver, obj: Any, info: GraphQLResolveInfo, **kwargs) -> Any:
+        if not should_trace(info):
+            return next_(obj, info, **kwargs)
+        start = perf_counter()
+        try:
+            return next_(obj, info, **kwargs)
+        finally:
+            duration = perf_counter() - start
+            field = f"{info.parent_type.name}.{info.field_name}"
+            self.profiler.record_field(field, duration)
+            if self.trace is not None:
+                if self.trace["operation"] is None and info.operation.name is not None:
+                    self.trace["operation"] = info.operation.name.value
+                self.trace["resolvers"].append({
+                    "path": format_path(info.path),
+                    "field": field,
+                    "start_offset": start - self.start,
+                    "duration": duration,
+                })
+
+
+class ProfiledDataLoader(SyncDataLoader):
+    def __init__(self, profiler: Profiler, name: str, batch_load_fn) -> None:
+        super().__init__(self._profiled_batch_load)
+        self.profiler = profiler
+        self.name = name
+        self._profiled_batch_load_fn = batch_load_fn
+
+    def load(self, key):
+        self.profiler.loader_loads[self.name] += 1
+        if key in self._cache:
+            self.profiler.loader_hits[self.name] += 1
+        return super().load(key)
+
+    def _profiled_batch_load(self, keys):
+        start = perf_counter()
+        try:
+            return self._profiled_batch_load_fn(keys)
+        finally:
+            duration = perf_counter() - start
+            self.profiler.loader_batch_sizes[self.name].observe(len(keys))
+            self.profiler.loader_batch_latency[self.name].observe(duration)
+            extension = _traced_extension.get()
+            if extension is not None:
+                extension.trace["loaders"].append({
+                    "loader": self.name,
+                    "batch_size": len(keys),
+                    "start_offset": start - extension.start,
+                    "duration": duration,
+                })
@@ -0,0 +1,137 @@
+import unittest
+from ariadne import graphql_sync
+from graphql_sync_dataloaders import DeferredExecutionContext
+from starlette.testclient import TestClient
+
+from app import create_app, generate_schema
+from profiling import Profiler
+from resolvers import Resolver
+from resolvers_test import COMPANY_INFO_LOOKUP_QUERY, INSERT_ACQUISITION_QUERY, INSERT_COMPANY_QUERY, empty_db
+from store.loader import DataLoader
+
+
+def profiled_graphql_context(engine, profiler):
+    loader = DataLoader(engine)
+    return {
+        "company_data_loader": profiler.data_loader("company", loader.get_company),
+        "employment_data_loader": profiler.data_loader("employment", loader.get_employment),
+        "person_data_loader": profiler.data_loader("person", loader.get_person),
+    }
+
+
+class TestProfiler(unittest.TestCase):
+    def test_profiling_feature(self):
+        engine = empty_db()
+        schema = generate_schema(Resolver(engine))
+        # Every request is sampled and considered slow
+        profiler = Profiler(slow_threshold=0, slow_sample_rate=1)
+        context = profiled_graphql_context(engine, profiler)
+
+        def _graphql(query_string, variable_values):
+            return graphql_sync(schema, {"query": query_string, "variables": variable_values},
+                                context_value=context,
+                                extensions=[profiler.extension],
+                                execution_context_class=DeferredExecutionContext)
+
+        # Step 1: Add 3 companies, Big Corp 1 acquired the other two
+        success, r1 = _graphql(INSERT_COMPANY_QUERY, {
+            "companies": [
+                {"company_id": 1, "company_name": "Big Corp 1", "headcount": 10000},
+                {"company_id": 2, "company_name": "Small Corp 2", "headcount": 2000},
+                {"company_id": 3, "company_name": "Startup 3", "headcount": 30},
+            ]
+        })
+        self.assertTrue(success)
+        success, r1 = _graphql(INSERT_ACQUISITION_QUERY, {"acquisitions": [
+            {"parent_company_id": 1, "acquired_company_id": 2,
+             "merged_into_parent_company": False},
+            {"parent_company_id": 1, "acquired_company_id": 3,
+             "merged_into_parent_company": False},
+        ]})
+        self.assertTrue(success)
+
+        # Step 2: Look up Big Corp 1 twice
+        for _ in range(2):
+            success, r2 = _graphql(COMPANY_INFO_LOOKUP_QUERY, {"companyId": 1})
+            self.assertTrue(success)
+            self.assertNotIn("errors", r2)
+
+        # Step 3: Verify field calls, resolvers without a custom resolver are not counted
+        self.assertEqual(profiler.field_calls["Query.company"], 2)
+        self.assertEqual(profiler.field_calls["Company.acquired"], 2)
+        self.assertEqual(profiler.field_calls["Mutation.addCompany"], 1)
+        self.assertNotIn("Company.companyName", profiler.field_calls)
+        self.assertEqual(profiler.field_latency["Query.company"].count, 2)
+
+        # Step 4: Verify DataLoader stats, the second lookup is served from the cache except Big Corp 1 itself
+        self.assertEqual(profiler.loader_loads["company"], 6)
+        self.assertEqual(profiler.loader_hits["company"], 2)
+        self.assertEqual(profiler.loader_batch_sizes["company"].count, 3)
+        self.assertEqual(profiler.loader_batch_sizes["company"].sum, 4)
+
+        # Step 5: Verify every request was captured as a slow trace
+        self.assertEqual(profiler.request_latency.count, 4)
+        self.assertEqual(len(profiler.slow_traces), 4)
+        trace = profiler.slow_traces[-1]
+        self.assertEqual(trace["operation"], "CompanyLookup")
+        self.assertListEqual([r["path"] for r in trace["resolvers"]],
+                             [["company"], ["company", "acquiredBy"], ["company", "acquired"]])
+        # DataLoader batches run after the resolvers that queued them, and are traced on their own
+        self.assertListEqual([(l["loader"], l["batch_size"]) for l in profiler.slow_traces[-2]["loaders"]],
+                             [("company", 1), ("company", 2)])
+        self.assertListEqual([(l["loader"], l["batch_size"]) for l in trace["loaders"]], [("company", 1)])
+        self.assertGreaterEqual(trace["loaders"][0]["start_offset"], trace["resolvers"][0]["start_offset"])
+
+        # Step 6: Verify metrics are rendered in Prometheus text format
+        metrics = profiler.render_metrics()
+        self.assertIn('company_kg_field_calls_total{field="Company.acquired"} 2', metrics)
+        self.assertIn('company_kg_dataloader_cache_hits_total{loader="company"} 2', metrics)
+        self.assertIn('company_kg_dataloader_batch_size_bucket{loader="company",le="+Inf"} 3', metrics)
+        self.assertIn("company_kg_request_duration_seconds_count 4", metrics)
+
+    def test_slow_trace_threshold(self):
+        engine = empty_db()
+        schema = generate_schema(Resolver(engine))
+        profiler = Profiler(slow_threshold=60, slow_sample_rate=1)
+
+        success, _ = graphql_sync(schema, {"query": COMPANY_INFO_LOOKUP_QUERY, "variables": {"companyId": 1}},
+                                  context_value=profiled_graphql_context(engine, profiler),
+                                  extensions=[profiler.extension],
+                                  execution_context_class=DeferredExecutionContext)
+        self.assertTrue(success)
+        # Fast requests still feed the histograms, but keep no trace
+        self.assertEqual(profiler.request_latency.count, 1)
+        self.assertEqual(len(profiler.slow_traces), 0)
+
+    def test_profiling_endpoints(self):
+        profiler = Profiler(slow_threshold=0, slow_sample_rate=1)
+        with TestClient(create_app(profiler)) as client:
+            def _request_count():
+                r = client.get("/metrics")
+                self.assertEqual(r.status_code, 200)
+                return [line for line in r.text.splitlines()
+                        if line.startswith("company_kg_request_duration_seconds_count")]
+
+            # Step 1: No GraphQL request has been made yet
+            self.assertListEqual(_request_count(), ["company_kg_request_duration_seconds_count 0"])
+
+            # Step 2: A GraphQL request goes through the profiling extension
+            r2 = client.post("/", json={"query": COMPANY_INFO_LOOKUP_QUERY, "variables": {"companyId": 1}})
+            self.assertEqual(r2.status_code, 200)
+            self.assertNotIn("errors", r2.json())
+            self.assertListEqual(_request_count(), ["company_kg_request_duration_seconds_count 1"])
+
+            # Step 3: The request was sampled and slower than the threshold, so its trace is kept
+            r3 = client.get("/slow_traces")
+            self.assertEqual(r3.status_code, 200)
+            self.assertEqual(len(r3.json()), 1)
+            self.assertEqual(r3.json()[0]["operation"], "CompanyLookup")
+            self.assertListEqual([l["loader"] for l in r3.json()[0]["loaders"]], ["company"])
+
+        # Without a profiler the endpoints are not registered
+        with TestClient(create_app()) as client:
+            self.assertNotIn("company_kg_request_duration_seconds", client.get("/metrics").text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,21 @@
 from ariadne import MutationType, ObjectType, QueryType
-from store import Company, Acquisition, Employment, EntityLink, EntityType, EntityRelationship
+from store import Company, Acquisition, Employment, EntityLink, EntityType, EntityRelationship, ChangeOperation
+from store import ChangeFeed, record_change
 from sqlalchemy.orm import Session
-from sqlalchemy import Engine, insert, select, update
+from sqlalchemy import Engine, and_, insert, or_, select, update
 from sqlalchemy.dialects.sqlite import insert as sqlite_upsert
 
+# Upper bounds for connectionPath, so a query touching a hub company can't scan the whole graph
+MAX_CONNECTION_HOPS = 6
+MAX_CONNECTION_VISITED = 10000
+# Upper bound for a single changesSince page
+MAX_CHANGES_PAGE = 1000
+
 
 class Resolver:
     def __init__(self, engine: Engine) -> None:
         self.engine = engine
+        self.change_feed = ChangeFeed(engine)
 
     def resolve_company(self, company: ObjectType):
         company.set_field("acquiredBy", self.resolve_company_acquired_by)
@@ -26,12 +34,20 @@ class Resolver:
         person_employment.set_field(
             "person", self.resolve_person_employment_person)
 
+    def resolve_connection_node(self, connection_node: ObjectType):
+        connection_node.set_field(
+            "company", self.resolve_connection_node_company)
+        connection_node.set_field(
+            "person", self.resolve_connection_node_person)
+
     def resolve_query(self, query: QueryType):
         query.set_field("debugCompany", self.resolve_debug_company)
         query.set_field("debugAquisition", self.resolve_debug_aquisition)
         query.set_field("debugEntityLink", self.resolve_debug_entity_link)
         query.set_field("company", self.resolve_query_company)
         query.set_field("person", self.resolve_query_person)
+        query.set_field("connectionPath", self.resolve_query_connection_path)
+        query.set_field("changesSince", self.resolve_query_changes_since)
 
     def resovle_mutation(self, mutation: MutationType):
         mutation.set_field(
@@ -66,7 +82,7 @@ class Resolver:
                 ]))
             )
             return [info.context["company_data_loader"].load(c.right_id)
-                    for c in session.scalars(stmt)]
+                    for c in session.scalars(stmt.order_by(EntityLink.id))]
 
     def resolve_company_employees(self, obj, info, ex_company_ids):
         with Session(self.engine) as session:
@@ -98,7 +114,7 @@ class Resolver:
                 stmt = stmt.where(EntityLink.left_id.in_(
                     person_worked_in_ex_companies))
             return [info.context["employment_data_loader"].load(e.relationship_id)
-                    for e in session.scalars(stmt)]
+                    for e in session.scalars(stmt.order_by(EntityLink.id))]
 
     def resolve_person_employment_is_currently_employed(self, obj, *_):
         return obj["end_date"] is None
@@ -120,7 +136,7 @@ class Resolver:
                 ]))
             )
             return [info.context["employment_data_loader"].load(e.relationship_id)
-                    for e in session.scalars(stmt)]
+                    for e in session.scalars(stmt.order_by(EntityLink.id))]
 
     def resolve_query_company(self, obj, info, company_id):
         # For a new query, always clear cache
@@ -132,6 +148,122 @@ class Resolver:
         info.context["person_data_loader"].clear(person_id)
         return info.context["person_data_loader"].load(person_id)
 
+    def resolve_connection_node_company(self, obj, info):
+        if obj["entity_type"] is not EntityType.COMPANY:
+            return None
+        return info.context["company_data_loader"].load(obj["entity_id"])
+
+    def resolve_connection_node_person(self, obj, info):
+        if obj["entity_type"] is not EntityType.PERSON:
+            return None
+        return info.context["person_data_loader"].load(obj["entity_id"])
+
+    def resolve_query_connection_path(self, obj, info, max_hops, max_visited, **endpoints):
+        # "from" is a python keyword, so the endpoints arrive as keyword arguments
+        source = (endpoints["from"]["entity_type"], endpoints["from"]["entity_id"])
+        target = (endpoints["to"]["entity_type"], endpoints["to"]["entity_id"])
+        max_hops = min(max_hops, MAX_CONNECTION_HOPS)
+        max_visited = min(max_visited, MAX_CONNECTION_VISITED)
+        if source == target:
+            return {"path": self._connection_path([source], []), "truncated": False}
+        # node -> (previous node, link), walking back towards source / target respectively
+        forward = {source: None}
+        backward = {target: None}
+        forward_frontier, backward_frontier = {source}, {target}
+        forward_depth, backward_depth = 0, 0
+        with Session(self.engine) as session:
+            while forward_frontier and backward_frontier and forward_depth + backward_depth < max_hops:
+                # Always expand the smaller side, one IN query per hop unless it has to page past visited entities
+                expand_forward = len(forward_frontier) <= len(backward_frontier)
+                visited, other = (forward, backward) if expand_forward else (backward, forward)
+                frontier = forward_frontier if expand_forward else backward_frontier
+                # Links already walked, starting with the one each frontier entity was reached by
+                walked = {visited[node][1].id for node in frontier if visited[node] is not None}
+                next_frontier = set()
+                meeting = None
+                while True:
+                    # Each link adds at most one entity, so one link past the remaining budget is enough to tell
+                    # whether an unvisited entity is left over
+                    limit = max(max_visited - len(forward) - len(backward), 0) + 1
+                    links = session.scalars(
+                        self._frontier_links_stmt(frontier).where(EntityLink.id.not_in(walked)).limit(limit)).all()
+                    for link in links:
+                        walked.add(link.id)
+                        left = (link.left_type, link.left_id)
+                        right = (link.right_type, link.right_id)
+                        for current, neighbor in ((left, right), (right, left)):
+                            if current not in frontier or neighbor in visited:
+                                continue
+                            visited[neighbor] = (current, link)
+                            next_frontier.add(neighbor)
+                            if neighbor in other and meeting is None:
+                                meeting = neighbor
+                    if meeting is not None:
+                        # Every entity meeting the other side within a hop is on a shortest path, even a partial hop
+                        return {"path": self._join_connection_path(meeting, forward, backward), "truncated": False}
+                    if len(forward) + len(backward) > max_visited:
+                        # An unvisited entity was found past the budget, flag it so it is not mistaken for "not connected"
+                        return {"path": None, "truncated": True}
+                    if len(links) < limit:
+                        break
+                    # The page was filled by links back to visited entities, keep reading the rest of the hop
+                if expand_forward:
+                    forward_frontier, forward_depth = next_frontier, forward_depth + 1
+                else:
+                    backward_frontier, backward_depth = next_frontier, backward_depth + 1
+        return {"path": None, "truncated": False}
+
+    def _frontier_links_stmt(self, frontier):
+        conditions = []
+        for entity_type in EntityType:
+            ids = [entity_id for t, entity_id in frontier if t is entity_type]
+            if len(ids) == 0:
+                continue
+            conditions.append(and_(EntityLink.left_type.is_(entity_type), EntityLink.left_id.in_(ids)))
+            conditions.append(and_(EntityLink.right_type.is_(entity_type), EntityLink.right_id.in_(ids)))
+        return select(EntityLink).where(or_(*conditions))
+
+    def _join_connection_path(self, meeting, forward, backward):
+        nodes, links = [meeting], []
+        node = meeting
+        while forward[node] is not None:
+            node, link = forward[node]
+            nodes.insert(0, node)
+            links.insert(0, link)
+        node = meeting
+        while backward[node] is not None:
+            node, link = backward[node]
+            nodes.append(node)
+            links.append(link)
+        return self._connection_path(nodes, links)
+
+    def _connection_path(self, nodes, links):
+        return {
+            "hops": len(links),
+            "nodes": [{"entity_type": t, "entity_id": i} for t, i in nodes],
+            "links": [self._entity_link_row(r) for r in links],
+        }
+
+    def _entity_link_row(self, r: EntityLink):
+        return {
+            "id": r.id,
+            "left_id": r.left_id,
+            "left_type": str(r.left_type),
+            "right_id": r.right_id,
+            "right_type": str(r.right_type),
+            "relationship_id": r.relationship_id,
+            "relationship_type": str(r.relationship_type),
+        }
+
+    def resolve_query_changes_since(self, obj, info, cursor, limit):
+        # SQLite treats a negative LIMIT as no limit at all, so clamp both ends
+        changes = self.change_feed.changes_since(cursor, max(0, min(limit, MAX_CHANGES_PAGE)))
+        return {
+            "changes": changes,
+            # Resume from here on the next call, unchanged when there is nothing new
+            "cursor": changes[-1]["id"] if len(changes) > 0 else cursor,
+        }
+
     def resolve_debug_company(self, obj, info):
         with Session(self.engine) as session:
             return [{
@@ -151,33 +283,39 @@ class Resolver:
 
     def resolve_debug_entity_link(self, obj, info):
         with Session(self.engine) as session:
-            return [{
-                "id": r.id,
-                "left_id": r.left_id,
-                "left_type": str(r.left_type),
-                "right_id": r.right_id,
-                "right_type": str(r.right_type),
-                "relationship_id": r.relationship_id,
-                "relationship_type": str(r.relationship_type),
-            } for r in session.scalars(select(EntityLink)).all()]
+            return [self._entity_link_row(r)
+                    for r in session.scalars(select(EntityLink)).all()]
 
     def resolve_mutation_add_company(self, obj, info, companies):
         try:
             with Session(self.engine) as session:
-                stmt = sqlite_upsert(Company).values([{
+                rows = [{
                     "id": c["company_id"],
                     "name": c["company_name"],
                     "headcount": c["headcount"] or 0
-                } for c in companies])
+                } for c in companies]
+                stmt = sqlite_upsert(Company).values(rows)
                 stmt = stmt.on_conflict_do_update(
                     index_elements=[Company.id],
                     set_=dict(name=stmt.excluded.name, headcount=stmt.excluded.headcount))
                 session.execute(stmt)
+                for r in rows:
+                    record_change(session, Company.__tablename__, r["id"], ChangeOperation.UPSERT, {
+                        "company_id": r["id"],
+                        "company_name": r["name"],
+                        "headcount": r["headcount"],
+                    })
                 session.commit()
             return "Done"
         except BaseException as e:
             return str(e)
 
+    def _add_entity_link(self, session: Session, link: EntityLink):
+        session.add(link)
+        session.flush()
+        record_change(session, EntityLink.__tablename__, link.id,
+                      ChangeOperation.INSERT, self._entity_link_row(link))
+
     def resolve_mutation_add_aquisition(self, obj, info, acquisitions):
         try:
             with Session(self.engine) as session:
@@ -187,8 +325,15 @@ class Resolver:
                         acquired_company_id=a["acquired_company_id"],
                         merged_into_parent_company=a["merged_into_parent_company"])
                     acquisition = session.execute(stmt)
+                    record_change(session, Acquisition.__tablename__, acquisition.inserted_primary_key.id,
+                                  ChangeOperation.INSERT, {
+                                      "id": acquisition.inserted_primary_key.id,
+                                      "parent_company_id": a["parent_company_id"],
+                                      "acquired_company_id": a["acquired_company_id"],
+                                      "merged_into_parent_company": a["merged_into_parent_company"],
+                                  })
                     # Insert the acquisition record
-                    session.add(EntityLink(
+                    self._add_entity_link(session, EntityLink(
                         left_id=a["parent_company_id"], left_type=EntityType.COMPANY,
                         right_id=a["acquired_company_id"], right_type=EntityType.COMPANY,
                         relationship_id=acquisition.inserted_primary_key.id,
@@ -205,7 +350,7 @@ class Resolver:
                     if grandfather is not None:
                     # If the parent company has already been acquired, the current acquisitoin is indirectly acquired by grandfather
                         grandfather_id = grandfather.left_id
-                        session.add(EntityLink(
+                        self._add_entity_link(session, EntityLink(
                             left_id=grandfather_id, left_type=EntityType.COMPANY,
                             right_id=a["acquired_company_id"], right_type=EntityType.COMPANY,
                             relationship_id=acquisition.inserted_primary_key.id,
@@ -218,16 +363,19 @@ class Resolver:
                         .where(EntityLink.left_type.is_(EntityType.COMPANY))
                         .where(EntityLink.relationship_type.in_([EntityRelationship.INDIRECTLY_ACQUIRED]))
                         .values(left_id=grandfather_id)
+                        .returning(EntityLink)
                     )
-                    session.execute(stmt)
+                    for link in session.scalars(stmt).all():
+                        record_change(session, EntityLink.__tablename__, link.id,
+                                      ChangeOperation.UPDATE, self._entity_link_row(link))
                     # The acquired companies's previous direct acquisition are now indirectly linked to the parent company or grandfather
                     for direct_acquisition in session.scalars(
                         select(EntityLink.right_id)
                         .where(EntityLink.left_id.is_(a["acquired_company_id"]))
                         .where(EntityLink.left_type.is_(EntityType.COMPANY))
                         .where(EntityLink.relationship_type.in_([EntityRelationship.MERGED, EntityRelationship.ACQUIRED]))
-                    ):
-                        session.add(EntityLink(
+                    ).all():
+                        self._add_entity_link(session, EntityLink(
                             left_id=grandfather_id, left_type=EntityType.COMPANY,
                             right_id=direct_acquisition, right_type=EntityType.COMPANY,
                             relationship_id=acquisition.inserted_primary_key.id,
@@ -243,14 +391,17 @@ class Resolver:
             with Session(self.engine) as session:
                 for e in employments:
                     previously_employed = "end_date" in e and e["end_date"] is not None
-                    employment = session.execute(insert(Employment).values(
-                        company_id=e["company_id"],
-                        person_id=e["person_id"],
-                        employment_title=e["employment_title"],
-                        start_date=e["start_date"] if "start_date" in e else None,
-                        end_date=e["end_date"] if previously_employed else None,
-                    ))
-                    session.add(EntityLink(
+                    row = {
+                        "company_id": e["company_id"],
+                        "person_id": e["person_id"],
+                        "employment_title": e["employment_title"],
+                        "start_date": e["start_date"] if "start_date" in e else None,
+                        "end_date": e["end_date"] if previously_employed else None,
+                    }
+                    employment = session.execute(insert(Employment).values(**row))
+                    record_change(session, Employment.__tablename__, employment.inserted_primary_key.id,
+                                  ChangeOperation.INSERT, dict(id=employment.inserted_primary_key.id, **row))
+                    self._add_entity_link(session, EntityLink(
                         left_id=e["person_id"], left_type=EntityType.PERSON,
                         right_id=e["company_id"], right_type=EntityType.COMPANY,
                         relationship_id=employment.inserted_primary_key.id,
@@ -1,3 +1,4 @@
+import json
 import unittest
 from graphql import graphql_sync
 from graphql_sync_dataloaders import DeferredExecutionContext, SyncDataLoader
@@ -99,6 +100,43 @@ query EmployeeLookup($companyId: Int!, $exCompanyIds: [Int!]!) {
 	}
 }"""
 
+CONNECTION_PATH_QUERY = """
+query ConnectionPath($from: EntityInput!, $to: EntityInput!, $maxHops: Int!, $maxVisited: Int! = 10000) {
+  connectionPath(from: $from, to: $to, maxHops: $maxHops, maxVisited: $maxVisited) {
+    path {
+      hops
+      nodes {
+        entityId
+        entityType
+        company {
+          companyName
+        }
+        person {
+          person_id
+        }
+      }
+      links {
+        relationship_type
+      }
+    }
+    truncated
+  }
+}"""
+
+CHANGES_SINCE_QUERY = """
+query ChangesSince($cursor: Int!, $limit: Int!) {
+  changesSince(cursor: $cursor, limit: $limit) {
+    changes {
+      id
+      table_name
+      row_id
+      operation
+      payload
+    }
+    cursor
+  }
+}"""
+
 
 class TestResovler(unittest.TestCase):
     def test_acquisition_feature(self):
@@ -271,6 +309,273 @@ class TestResovler(unittest.TestCase):
         self.assertListEqual([e["person"]["person_id"] for e in employee_list_3.data["company"]["employees"]],
                              [1, 2, 3, 4, 5])
 
+    def test_connection_path_feature(self):
+        engine = empty_db()
+        resolver = Resolver(engine)
+        schema = generate_schema(resolver)
+
+        def _graphql(query_string, variable_values):
+            return graphql_sync(schema, query_string,
+                                variable_values=variable_values,
+                                context_value=graphql_context(engine),
+                                execution_context_class=DeferredExecutionContext)
+
+        def _person(person_id):
+            return {"entityId": person_id, "entityType": "PERSON"}
+
+        def _company(company_id):
+            return {"entityId": company_id, "entityType": "COMPANY"}
+
+        # Step 1: Add 4 companies, Big Corp 1 acquired Small Corp 2
+        r1 = _graphql(INSERT_COMPANY_QUERY, {
+            "companies": [
+                {"company_id": 1, "company_name": "Big Corp 1", "headcount": 10000},
+                {"company_id": 2, "company_name": "Small Corp 2", "headcount": 2000},
+                {"company_id": 3, "company_name": "Small Corp 3", "headcount": 300},
+                {"company_id": 4, "company_name": "Startup 4", "headcount": 40},
+            ]
+        })
+        self.assertIsNone(r1.errors)
+        r1 = _graphql(INSERT_ACQUISITION_QUERY, {"acquisitions": [
+            {"parent_company_id": 1, "acquired_company_id": 2,
+             "merged_into_parent_company": False}
+        ]})
+        self.assertIsNone(r1.errors)
+
+        # Step 2: Person1 worked for [3, 2], Person2 worked for [3], Person3 worked for [4]
+        r2 = _graphql(INSERT_EMPLOYMENT_QUERY, {"employments": [
+            {"person_id": 1, "company_id": 3, "employment_title": "SDE I",
+                "start_date": "2020-01-01 00:00:00", "end_date": "2020-12-31 00:00:00"},
+            {"person_id": 1, "company_id": 2, "employment_title": "SDE II",
+                "start_date": "2021-01-01 00:00:00", "end_date": None},
+            {"person_id": 2, "company_id": 3, "employment_title": "Manager",
+                "start_date": "2020-01-01 00:00:00", "end_date": None},
+            {"person_id": 3, "company_id": 4, "employment_title": "CEO",
+                "start_date": "2021-01-01 00:00:00", "end_date": None},
+        ]})
+        self.assertIsNone(r2.errors)
+
+        # Step 3: Person2 is connected to Big Corp 1 through Small Corp 3, Person1 and Small Corp 2
+        r3 = _graphql(CONNECTION_PATH_QUERY, {
+            "from": _person(2), "to": _company(1), "maxHops": 4})
+        self.assertIsNone(r3.errors)
+        self.assertFalse(r3.data["connectionPath"]["truncated"])
+        path = r3.data["connectionPath"]["path"]
+        self.assertEqual(path["hops"], 4)
+        self.assertListEqual([(n["entityType"], n["entityId"]) for n in path["nodes"]],
+                             [("PERSON", 2), ("COMPANY", 3), ("PERSON", 1), ("COMPANY", 2), ("COMPANY", 1)])
+        self.assertEqual(path["nodes"][1]["company"]["companyName"], "Small Corp 3")
+        self.assertIsNone(path["nodes"][1]["person"])
+        self.assertEqual(path["nodes"][2]["person"]["person_id"], 1)
+        self.assertListEqual([l["relationship_type"] for l in path["links"]], [
+            "EntityRelationship.CURRENTLY_EMPLOYED_AT", "EntityRelationship.PREVIOUSLY_EMPLOYED_AT",
+            "EntityRelationship.CURRENTLY_EMPLOYED_AT", "EntityRelationship.ACQUIRED"])
+
+        # Step 4: The same connection is not found when limited to 3 hops
+        r4 = _graphql(CONNECTION_PATH_QUERY, {
+            "from": _person(2), "to": _company(1), "maxHops": 3})
+        self.assertIsNone(r4.errors)
+        self.assertIsNone(r4.data["connectionPath"]["path"])
+        self.assertFalse(r4.data["connectionPath"]["truncated"])
+
+        # Step 5: Person3 has no connection to Big Corp 1
+        r5 = _graphql(CONNECTION_PATH_QUERY, {
+            "from": _person(3), "to": _company(1), "maxHops": 6})
+        self.assertIsNone(r5.errors)
+        self.assertIsNone(r5.data["connectionPath"]["path"])
+        self.assertFalse(r5.data["connectionPath"]["truncated"])
+
+        # Step 6: An entity is connected to itself with 0 hops
+        r6 = _graphql(CONNECTION_PATH_QUERY, {
+            "from": _company(1), "to": _company(1), "maxHops": 4})
+        self.assertIsNone(r6.errors)
+        self.assertEqual(r6.data["connectionPath"]["path"]["hops"], 0)
+
+        # Step 7: Startup 4 becomes a hub with 20 more employees
+        r7 = _graphql(INSERT_EMPLOYMENT_QUERY, {"employments": [
+            {"person_id": person_id, "company_id": 4, "employment_title": "SDE",
+                "start_date": "2022-01-01 00:00:00", "end_date": None}
+            for person_id in range(10, 30)
+        ]})
+        self.assertIsNone(r7.errors)
+
+        # Step 8: A small visited budget gives up on the hub, flagged as truncated instead of "not connected"
+        r8 = _graphql(CONNECTION_PATH_QUERY, {
+            "from": _company(4), "to": _company(1), "maxHops": 6, "maxVisited": 10})
+        self.assertIsNone(r8.errors)
+        self.assertIsNone(r8.data["connectionPath"]["path"])
+        self.assertTrue(r8.data["connectionPath"]["truncated"])
+
+        # Step 9: With enough budget the hub is searched completely, and is still not connected
+        r9 = _graphql(CONNECTION_PATH_QUERY, {
+            "from": _company(4), "to": _company(1), "maxHops": 6, "maxVisited": 100})
+        self.assertIsNone(r9.errors)
+        self.assertIsNone(r9.data["connectionPath"]["path"])
+        self.assertFalse(r9.data["connectionPath"]["truncated"])
+
+    def test_connection_path_budget(self):
+        engine = empty_db()
+        resolver = Resolver(engine)
+        schema = generate_schema(resolver)
+
+        def _graphql(query_string, variable_values):
+            return graphql_sync(schema, query_string,
+                                variable_values=variable_values,
+                                context_value=graphql_context(engine),
+                                execution_context_class=DeferredExecutionContext)
+
+        def _search(max_visited):
+            r = _graphql(CONNECTION_PATH_QUERY, {
+                "from": {"entityId": 1, "entityType": "COMPANY"},
+                "to": {"entityId": 3, "entityType": "COMPANY"},
+                "maxHops": 6, "maxVisited": max_visited})
+            self.assertIsNone(r.errors)
+            return r.data["connectionPath"]
+
+        # Step 1: Person 1, 2, 3 work for Big Corp 1, Person 9 works for Small Corp 3, 6 entities in total
+        r1 = _graphql(INSERT_COMPANY_QUERY, {
+            "companies": [
+                {"company_id": 1, "company_name": "Big Corp 1", "headcount": 10000},
+                {"company_id": 3, "company_name": "Small Corp 3", "headcount": 300},
+            ]
+        })
+        self.assertIsNone(r1.errors)
+        r1 = _graphql(INSERT_EMPLOYMENT_QUERY, {"employments": [
+            {"person_id": person_id, "company_id": company_id, "employment_title": "SDE",
+                "start_date": "2022-01-01 00:00:00", "end_date": None}
+            for person_id, company_id in [(1, 1), (2, 1), (3, 1), (9, 3)]
+        ]})
+        self.assertIsNone(r1.errors)
+
+        # Step 2: A budget of exactly 6 entities completes the search, so they are reported as not connected
+        search = _search(6)
+        self.assertIsNone(search["path"])
+        self.assertFalse(search["truncated"])
+
+        # Step 3: One entity short of that, the search is truncated
+        search = _search(5)
+        self.assertIsNone(search["path"])
+        self.assertTrue(search["truncated"])
+
+        # Step 4: Person 9 previously worked with Person 3 at Big Corp 1, links back to visited entities don't use up the budget
+        r4 = _graphql(INSERT_EMPLOYMENT_QUERY, {"employments": [
+            {"person_id": 9, "company_id": 1, "employment_title": "Intern",
+                "start_date": "2020-01-01 00:00:00", "end_date": "2020-12-31 00:00:00"},
+            {"person_id": 3, "company_id": 1, "employment_title": "Intern",
+                "start_date": "2020-01-01 00:00:00", "end_date": "2020-12-31 00:00:00"},
+        ]})
+        self.assertIsNone(r4.errors)
+        search = _search(6)
+        self.assertFalse(search["truncated"])
+        self.assertEqual(search["path"]["hops"], 2)
+
+    def test_change_feed_feature(self):
+        engine = empty_db()
+        resolver = Resolver(engine)
+        schema = generate_schema(resolver)
+
+        def _graphql(query_string, variable_values):
+            return graphql_sync(schema, query_string,
+                                variable_values=variable_values,
+                                context_value=graphql_context(engine),
+                                execution_context_class=DeferredExecutionContext)
+
+        def _changes(cursor, limit=100):
+            r = _graphql(CHANGES_SINCE_QUERY, {"cursor": cursor, "limit": limit})
+            self.assertIsNone(r.errors)
+            return r.data["changesSince"]
+
+        # Step 1: An empty store has no changes, cursor stays put
+        feed = _changes(0)
+        self.assertListEqual(feed["changes"], [])
+        self.assertEqual(feed["cursor"], 0)
+
+        # Step 2: Add 3 companies, each one is recorded
+        r2 = _graphql(INSERT_COMPANY_QUERY, {
+            "companies": [
+                {"company_id": 1, "company_name": "Big Corp 1", "headcount": 10000},
+                {"company_id": 2, "company_name": "Small Corp 2", "headcount": 2000},
+                {"company_id": 3, "company_name": "Startup 3", "headcount": 30},
+            ]
+        })
+        self.assertIsNone(r2.errors)
+        feed = _changes(0)
+        self.assertListEqual([(c["table_name"], c["row_id"], c["operation"]) for c in feed["changes"]], [
+            ("Company", 1, "ChangeOperation.UPSERT"),
+            ("Company", 2, "ChangeOperation.UPSERT"),
+            ("Company", 3, "ChangeOperation.UPSERT"),
+        ])
+        self.assertDictEqual(json.loads(feed["changes"][1]["payload"]), {
+            "company_id": 2, "company_name": "Small Corp 2", "headcount": 2000})
+        company_cursor = feed["cursor"]
+
+        # Step 3: Paging through the feed with a small limit
+        first_page = _changes(0, 2)
+        self.assertEqual(len(first_page["changes"]), 2)
+        second_page = _changes(first_page["cursor"], 2)
+        self.assertListEqual([c["row_id"] for c in second_page["changes"]], [3])
+        self.assertEqual(second_page["cursor"], company_cursor)
+
+        # Step 3.1: A negative limit returns nothing, rather than the whole change log
+        negative_page = _changes(0, -1)
+        self.assertListEqual(negative_page["changes"], [])
+        self.assertEqual(negative_page["cursor"], 0)
+
+        # Step 4: An employment records both the Employment row and its EntityLink
+        r4 = _graphql(INSERT_EMPLOYMENT_QUERY, {"employments": [
+            {"person_id": 1, "company_id": 3, "employment_title": "CEO",
+                "start_date": "2021-01-01 00:00:00", "end_date": None},
+        ]})
+        self.assertIsNone(r4.errors)
+        feed = _changes(company_cursor)
+        self.assertListEqual([(c["table_name"], c["operation"]) for c in feed["changes"]], [
+            ("Employment", "ChangeOperation.INSERT"),
+            ("EntityLink", "ChangeOperation.INSERT"),
+        ])
+        employment_cursor = feed["cursor"]
+
+        # Step 5: Small Corp 2 acquired Startup 3, then Big Corp 1 acquired Small Corp 2
+        r5 = _graphql(INSERT_ACQUISITION_QUERY, {"acquisitions": [
+            {"parent_company_id": 2, "acquired_company_id": 3,
+             "merged_into_parent_company": False},
+        ]})
+        self.assertIsNone(r5.errors)
+        r5 = _graphql(INSERT_ACQUISITION_QUERY, {"acquisitions": [
+            {"parent_company_id": 1, "acquired_company_id": 2,
+             "merged_into_parent_company": False},
+        ]})
+        self.assertIsNone(r5.errors)
+        feed = _changes(employment_cursor)
+        self.assertListEqual([(c["table_name"], c["operation"]) for c in feed["changes"]], [
+            ("Acquisition", "ChangeOperation.INSERT"),
+            ("EntityLink", "ChangeOperation.INSERT"),
+            ("Acquisition", "ChangeOperation.INSERT"),
+            ("EntityLink", "ChangeOperation.INSERT"),
+            ("EntityLink", "ChangeOperation.INSERT"),
+        ])
+        # Big Corp 1 now indirectly acquired Startup 3
+        indirect_link = json.loads(feed["changes"][-1]["payload"])
+        self.assertEqual(indirect_link["left_id"], 1)
+        self.assertEqual(indirect_link["right_id"], 3)
+        self.assertEqual(indirect_link["relationship_type"], "EntityRelationship.INDIRECTLY_ACQUIRED")
+        acquisition_cursor = feed["cursor"]
+
+        # Step 6: Company 4 acquires Big Corp 1, the indirect link is re-parented to Company 4
+        r6 = _graphql(INSERT_COMPANY_QUERY, {
+            "companies": [{"company_id": 4, "company_name": "Mega Corp 4", "headcount": None}]
+        })
+        self.assertIsNone(r6.errors)
+        r6 = _graphql(INSERT_ACQUISITION_QUERY, {"acquisitions": [
+            {"parent_company_id": 4, "acquired_company_id": 1,
+             "merged_into_parent_company": True},
+        ]})
+        self.assertIsNone(r6.errors)
+        feed = _changes(acquisition_cursor)
+        updates = [c for c in feed["changes"] if c["operation"] == "ChangeOperation.UPDATE"]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0]["row_id"], indirect_link["id"])
+        self.assertEqual(json.loads(updates[0]["payload"])["left_id"], 4)
+
 
 if __name__ == '__main__':
     unittest.main()
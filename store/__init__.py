@@ -1,2 +1,3 @@
-from .model import Base, Company, Acquisition, Employment, EntityLink, EntityType, EntityRelationship
+from .model import Base, Company, Acquisition, Employment, EntityLink, EntityType, EntityRelationship, ChangeLog, ChangeOperation
 from .loader import DataLoader
+from .changes import ChangeFeed, record_change
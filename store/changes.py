@@ -0,0 +1,33 @@
+import json
+from typing import List
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+
+from store.model import ChangeLog, ChangeOperation
+
+
+def record_change(session: Session, table_name: str, row_id: int, operation: ChangeOperation, payload: dict):
+    # Appended within the caller's session, so the change is committed together with the row itself
+    session.add(ChangeLog(table_name=table_name, row_id=row_id,
+                          operation=operation, payload=json.dumps(payload)))
+
+
+class ChangeFeed():
+    def __init__(self, engine: Engine) -> None:
+        self.engine = engine
+
+    def changes_since(self, cursor: int, limit: int) -> List[dict]:
+        with Session(self.engine) as session:
+            stmt = (
+                select(ChangeLog)
+                .where(ChangeLog.id > cursor)
+                .order_by(ChangeLog.id)
+                .limit(limit)
+            )
+            return [{
+                "id": c.id,
+                "table_name": c.table_name,
+                "row_id": c.row_id,
+                "operation": str(c.operation),
+                "payload": c.payload,
+            } for c in session.scalars(stmt)]
@@ -17,6 +17,12 @@ class EntityRelationship(enum.Enum):
     PREVIOUSLY_EMPLOYED_AT = 5
 
 
+class ChangeOperation(enum.Enum):
+    UPSERT = 1
+    INSERT = 2
+    UPDATE = 3
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -79,3 +85,22 @@ class EntityLink(Base):
             f"right_id={self.right_id!r}, right_type={self.right_type!r}, " +\
             f"relationship_id={self.relationship_id!r}, relationship_type={self.relationship_type!r})"
 
+Index("idx_entitylink_left", EntityLink.left_type, EntityLink.left_id)
+Index("idx_entitylink_right", EntityLink.right_type, EntityLink.right_id)
+
+
+class ChangeLog(Base):
+    __tablename__ = "ChangeLog"
+    # AUTOINCREMENT keeps ids strictly increasing, so they can be handed out as cursors
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    table_name: Mapped[str] = mapped_column()
+    row_id: Mapped[int] = mapped_column()
+    operation: Mapped[ChangeOperation] = mapped_column(Enum(ChangeOperation))
+    # JSON encoded snapshot of the row after the change
+    payload: Mapped[str] = mapped_column()
+
+    def __repr__(self) -> str:
+        return f"{self.__tablename__}(id={self.id!r}, table_name={self.table_name!r}, row_id={self.row_id!r}, " + \
+            f"operation={self.operation!r}, payload={self.payload!r})"